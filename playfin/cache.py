@@ -1,21 +1,103 @@
-import requests
+import os
+import hashlib
+from collections import OrderedDict
 from pathlib import Path
-from .config import *
 
+
+class MemoryCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        if key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        return self.entries[key][0]
+
+    def put(self, key, value, size):
+        if key in self.entries:
+            self.size -= self.entries.pop(key)[1]
+        self.entries[key] = (value, size)
+        self.size += size
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.size -= evicted
+
+
+class DiskCache:
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(repr(key).encode()).hexdigest())
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # mtime doubles as last-used time for eviction
+            return data
+        except OSError:
+            return None
+
+    def put(self, key, data):
+        path = self.path(key)
+        try:
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(path + ".tmp", path)
+        except OSError:
+            return
+        self.prune()
+
+    def prune(self):
+        files = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            # Another put may have just renamed or evicted this entry
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+            except OSError:
+                pass
+
+
+# Keyed by (server url, show id): mirrored servers can hand out the same ids
 show_watch_cache = {}
 season_watch_cache = {}
+pending_shows = set()
 
 
-def cache_show_watch_status(show_id, headers, jellyfin_url):
-    if show_id in show_watch_cache:
+async def cache_show_watch_status(show_id, server):
+    key = (server.url, show_id)
+    if key in show_watch_cache or key in pending_shows:
         return
 
-    episodes = (
-        requests.get(f"{jellyfin_url}/Shows/{show_id}/Episodes", headers=headers)
-        .json()
-        .get("Items", [])
-    )
+    pending_shows.add(key)
+    try:
+        episodes = await server.get_items(f"/Shows/{show_id}/Episodes")
+    finally:
+        pending_shows.discard(key)
+
+    show_watch_cache[key] = summarize_watch_status(episodes)
+
 
+def summarize_watch_status(episodes):
     show_has_watched = False  # Start with False
     show_has_partial = False
     season_status = {}
@@ -62,22 +144,23 @@ def cache_show_watch_status(show_id, headers, jellyfin_url):
             season["partial"] = True
         season["watched"] = season["has_watched"] and not season["has_unwatched"]
 
-    show_watch_cache[show_id] = {
+    return {
         "watched": show_has_watched,
         "partial": show_has_partial,
         "seasons": season_status,
     }
 
 
-def get_cached_show_status(show_id, headers, jellyfin_url):
-    if show_id not in show_watch_cache:
-        cache_show_watch_status(show_id, headers, jellyfin_url)
-    return show_watch_cache[show_id]
+# The getters never block: they return None until the status has been
+# fetched by cache_show_watch_status
+def get_cached_show_status(show_id, server):
+    return show_watch_cache.get((server.url, show_id))
 
 
-def get_cached_season_status(show_id, season_id, headers, jellyfin_url):
-    if show_id not in show_watch_cache:
-        cache_show_watch_status(show_id, headers, jellyfin_url)
-    return show_watch_cache[show_id]["seasons"].get(
+def get_cached_season_status(show_id, season_id, server):
+    key = (server.url, show_id)
+    if key not in show_watch_cache:
+        return None
+    return show_watch_cache[key]["seasons"].get(
         season_id, {"watched": False, "partial": False}
     )
@@ -14,9 +14,18 @@ def load_config():
         with open(CONFIG_FILE, "r") as f:
             config = json.load(f)
 
-        # Decrypt password
+        # Older configs only hold a single server
+        if "SERVERS" not in config:
+            config["SERVERS"] = [{
+                "JELLYFIN_URL": config.pop("JELLYFIN_URL"),
+                "JELLYFIN_USERNAME": config.pop("JELLYFIN_USERNAME"),
+                "JELLYFIN_PASSWORD": config.pop("JELLYFIN_PASSWORD"),
+            }]
+
+        # Decrypt passwords
         key = config["ENCRYPTION_KEY"]
-        config["JELLYFIN_PASSWORD"] = decrypt_password(config["JELLYFIN_PASSWORD"], key)
+        for server in config["SERVERS"]:
+            server["JELLYFIN_PASSWORD"] = decrypt_password(server["JELLYFIN_PASSWORD"], key)
         return config
     except Exception as e:
         return None
@@ -27,11 +36,17 @@ def save_config(config):
         if "ENCRYPTION_KEY" not in config:
             config["ENCRYPTION_KEY"] = generate_key()
 
-        # Encrypt password before saving
+        # Encrypt passwords before saving
         config_copy = config.copy()
-        config_copy["JELLYFIN_PASSWORD"] = encrypt_password(
-            config["JELLYFIN_PASSWORD"], config["ENCRYPTION_KEY"]
-        )
+        config_copy["SERVERS"] = [
+            dict(
+                server,
+                JELLYFIN_PASSWORD=encrypt_password(
+                    server["JELLYFIN_PASSWORD"], config["ENCRYPTION_KEY"]
+                ),
+            )
+            for server in config["SERVERS"]
+        ]
 
         os.makedirs(os.path.dirname(CONFIG_FILE), exist_ok=True)
         with open(CONFIG_FILE, "w") as f:
@@ -50,14 +65,18 @@ def get_credentials():
 
     # Get new credentials
     stdscr.clear()
-    config = {
-        "JELLYFIN_URL": get_input(
-            stdscr,
-            "Enter Jellyfin server URL (e.g., http://localhost:8096): "
-        ),
-        "JELLYFIN_USERNAME": get_input(stdscr, "Enter Jellyfin username: "),
-        "JELLYFIN_PASSWORD": get_input(stdscr, "Enter Jellyfin password: ", hidden=True),
-    }
+    config = {"SERVERS": []}
+    while True:
+        config["SERVERS"].append({
+            "JELLYFIN_URL": get_input(
+                stdscr,
+                "Enter Jellyfin server URL (e.g., http://localhost:8096): "
+            ),
+            "JELLYFIN_USERNAME": get_input(stdscr, "Enter Jellyfin username: "),
+            "JELLYFIN_PASSWORD": get_input(stdscr, "Enter Jellyfin password: ", hidden=True),
+        })
+        if get_input(stdscr, "Add another server? (y/N): ").strip().lower() != "y":
+            break
 
     if save_config(config):
         stdscr.addstr(0, 0, "Credentials saved successfully!", curses.color_pair(1))
@@ -1,3 +1,5 @@
 from pathlib import Path
 
-CONFIG_FILE = str(Path.home() / ".config/playfin/config.json")
\ No newline at end of file
+CONFIG_FILE = str(Path.home() / ".config/playfin/config.json")
+POSTER_CACHE_DIR = str(Path.home() / ".cache/playfin/posters")
+TRICKPLAY_CACHE_DIR = str(Path.home() / ".cache/playfin/trickplay")
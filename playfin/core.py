@@ -0,0 +1,104 @@
+import sys
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+WAKE = -1  # shows up as a "key" when background work finished and the screen should redraw
+ESC = 27
+BLOCKING_WORKERS = 32  # threads for blocking requests/decoding
+
+loop = None
+keys = None
+stdscr = None
+wake_pending = False
+
+
+def run(screen, coro):
+    return asyncio.run(_main(screen, coro))
+
+
+async def _main(screen, coro):
+    global loop, keys, stdscr
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=BLOCKING_WORKERS))
+    keys = asyncio.Queue()
+    stdscr = screen
+
+    resume_input()
+    try:
+        return await coro
+    finally:
+        pause_input()
+
+
+# === CURSES INPUT ===
+def _read_keys():
+    # stdin is readable: drain everything curses has for us into the queue
+    while True:
+        key = stdscr.getch()
+        if key == -1:
+            break
+        keys.put_nowait(key)
+
+
+def resume_input():
+    stdscr.nodelay(True)
+    loop.add_reader(sys.stdin.fileno(), _read_keys)
+
+
+def pause_input():
+    # While mpv owns the terminal we must not steal its keypresses
+    loop.remove_reader(sys.stdin.fileno())
+    stdscr.nodelay(False)
+
+
+def wake():
+    global wake_pending
+    if loop is None or wake_pending:
+        return
+    wake_pending = True
+    loop.call_soon_threadsafe(keys.put_nowait, WAKE)
+
+
+async def get_key():
+    global wake_pending
+    key = await keys.get()
+    if key == WAKE:
+        wake_pending = False
+    return key
+
+
+async def until_escape(coro):
+    # Run coro, giving up on it (and returning None) if ESC is pressed first
+    task = asyncio.ensure_future(coro)
+    while not task.done():
+        key_task = asyncio.ensure_future(get_key())
+        await asyncio.wait({task, key_task}, return_when=asyncio.FIRST_COMPLETED)
+        if not key_task.done():
+            key_task.cancel()
+        elif key_task.result() == ESC and not task.done():
+            task.cancel()
+            return None
+    return task.result()
+
+
+# === BACKGROUND WORK ===
+class Scope:
+    # Tasks that belong to one screen, cancelled together when leaving it
+    def __init__(self):
+        self.tasks = set()
+
+    def spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self._done)
+        return task
+
+    def _done(self, task):
+        self.tasks.discard(task)
+        # Failures are dropped; nothing should print over the curses screen
+        if not task.cancelled():
+            task.exception()
+
+    def cancel(self):
+        for task in list(self.tasks):
+            task.cancel()
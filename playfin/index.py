@@ -0,0 +1,127 @@
+from bisect import insort
+from .servers import sort_key
+
+
+def name_key(item):
+    # Episodes go by season and episode number rather than by their
+    # "1. Name" labels, which would put 10 before 2
+    if item.get("Type") == "Episode":
+        return (item.get("ParentIndexNumber") or 0, item.get("IndexNumber") or 0, sort_key(item))
+    return (0, 0, sort_key(item))
+
+
+# (label, key, descending)
+SORT_ORDERS = [
+    ("Name", name_key, False),
+    ("Date added", lambda item: item.get("DateCreated") or "", True),
+    ("Rating", lambda item: item.get("CommunityRating") or 0, True),
+    ("Last played", lambda item: item.get("UserData", {}).get("LastPlayedDate") or "", True),
+]
+
+
+def is_unwatched(item):
+    user_data = item.get("UserData", {})
+    return not user_data.get("Played", False)
+
+
+class ListIndex:
+    # Sort orders and filter bitmaps are built once per list load, so changing
+    # the sort or toggling a filter only picks (or combines) what is already there.
+    def __init__(self, items):
+        self.items = items
+        self.all = (1 << len(items)) - 1
+
+        self.keys = []
+        self.orders = []
+        for _, key, _ in SORT_ORDERS:
+            keys = [key(item) for item in items]
+            self.keys.append(keys)
+            self.orders.append(sorted(range(len(items)), key=keys.__getitem__))
+
+        self.unwatched = 0
+        self.genres = {}
+        self.years = {}
+        for position, item in enumerate(items):
+            bit = 1 << position
+            if is_unwatched(item):
+                self.unwatched |= bit
+            for genre in item.get("Genres") or []:
+                self.genres[genre] = self.genres.get(genre, 0) | bit
+            year = item.get("ProductionYear")
+            if year:
+                self.years[year] = self.years.get(year, 0) | bit
+
+        self.genre_choices = [None] + sorted(self.genres)
+        self.year_choices = [None] + sorted(self.years, reverse=True)
+
+        self.sort = 0
+        self.unwatched_only = False
+        self.genre = None
+        self.year = None
+        self._views = {}
+
+    def describe(self):
+        parts = [f"Sort: {SORT_ORDERS[self.sort][0]}"]
+        if self.unwatched_only:
+            parts.append("Unwatched")
+        if self.genre:
+            parts.append(self.genre)
+        if self.year:
+            parts.append(str(self.year))
+        return " | ".join(parts)
+
+    def next_sort(self):
+        self.sort = (self.sort + 1) % len(SORT_ORDERS)
+
+    def toggle_unwatched(self):
+        self.unwatched_only = not self.unwatched_only
+
+    def next_genre(self):
+        choices = self.genre_choices
+        self.genre = choices[(choices.index(self.genre) + 1) % len(choices)]
+
+    def next_year(self):
+        choices = self.year_choices
+        self.year = choices[(choices.index(self.year) + 1) % len(choices)]
+
+    def mask(self):
+        mask = self.all
+        if self.unwatched_only:
+            mask &= self.unwatched
+        if self.genre:
+            mask &= self.genres[self.genre]
+        if self.year:
+            mask &= self.years[self.year]
+        return mask
+
+    def view(self):
+        # Positions into self.items, in display order
+        state = (self.sort, self.unwatched_only, self.genre, self.year)
+        if state not in self._views:
+            mask = self.mask()
+            order = self.orders[self.sort]
+            if SORT_ORDERS[self.sort][2]:
+                order = reversed(order)
+            self._views[state] = [position for position in order if mask >> position & 1]
+        return self._views[state]
+
+    def update(self, position):
+        # Keep the index in step after an item's UserData changed (e.g. after playback)
+        item = self.items[position]
+        bit = 1 << position
+
+        for sort, (_, key, _) in enumerate(SORT_ORDERS):
+            keys = self.keys[sort]
+            new_key = key(item)
+            if keys[position] != new_key:
+                order = self.orders[sort]
+                order.remove(position)
+                keys[position] = new_key
+                insort(order, position, key=keys.__getitem__)
+
+        if is_unwatched(item):
+            self.unwatched |= bit
+        else:
+            self.unwatched &= ~bit
+
+        self._views.clear()
@@ -4,6 +4,10 @@ import curses
 from .constants import CONFIG_FILE
 from .config import get_credentials
 from .ui import *
+from .servers import Server, login_all, fetch_library, pick_source, refresh_user_data, ITEM_FIELDS
+from .index import ListIndex
+from .core import until_escape
+from . import core
 
 # Initialize curses first
 stdscr = init_curses()
@@ -11,9 +15,14 @@ stdscr = init_curses()
 try:
     # Get credentials with the initialized stdscr
     config = get_credentials()
-    JELLYFIN_URL = config["JELLYFIN_URL"]
-    JELLYFIN_USERNAME = config["JELLYFIN_USERNAME"]
-    JELLYFIN_PASSWORD = config["JELLYFIN_PASSWORD"]
+    configured_servers = [
+        Server(
+            server["JELLYFIN_URL"],
+            server["JELLYFIN_USERNAME"],
+            server["JELLYFIN_PASSWORD"],
+        )
+        for server in config["SERVERS"]
+    ]
 except Exception as e:
     cleanup()
     print(f"Failed to get credentials: {str(e)}")
@@ -22,102 +31,87 @@ except Exception as e:
 # Now import other modules that need these credentials
 from .cache import *
 from .mpv import *
-import requests
-import os
 
 
-# === LOGIN ===
-try:
-    device_id = os.uname().nodename
-    device = os.uname().sysname
-    auth_header = f'MediaBrowser Client="playfin", Device="{device}", DeviceId="{device_id}", Version="0.1"'
-    headers = {"Authorization": auth_header}
-
-    stdscr.addstr(0, 0, "Logging in to Jellyfin...", curses.A_BOLD)
-    stdscr.refresh()
+async def browse():
+    # === LOGIN ===
+    try:
+        stdscr.addstr(0, 0, "Logging in to Jellyfin...", curses.A_BOLD)
+        stdscr.refresh()
 
-    auth_res = requests.post(
-        f"{JELLYFIN_URL}/Users/AuthenticateByName",
-        headers=headers,
-        json={"Username": JELLYFIN_USERNAME, "Pw": JELLYFIN_PASSWORD},
-    )
-
-    if auth_res.status_code != 200:
+        servers, skipped_logins = await login_all(configured_servers)
+        enable_posters(config.get("POSTERS", "auto"))
+    except Exception as e:
         cleanup()
-        raise Exception("Login failed")
+        raise
 
-    data = auth_res.json()
-    token = data["AccessToken"]
-    user_id = data["User"]["Id"]
-    headers["X-Emby-Token"] = token
-except Exception as e:
-    cleanup()
-    raise
 
 
+    # === MAIN MENU ===
 
-# === MAIN MENU ===
 
 
+    # === MAIN MENU LOOP ===
+    while True:
+        media_type = await select_media_type()
 
-# === MAIN MENU LOOP ===
-while True:
-    media_type = select_media_type()
+        if media_type == "Series":
+            # === GET TV SHOWS ===
+            try:
+                stdscr.addstr(0, 0, "Loading TV shows... (ESC to cancel)", curses.A_BOLD)
+                stdscr.refresh()
 
-    if media_type == "Series":
-        # === GET TV SHOWS ===
-        try:
-            stdscr.addstr(0, 0, "Loading TV shows...", curses.A_BOLD)
-            stdscr.refresh()
+                loaded = await until_escape(fetch_library(servers, "Series"))
+                if loaded is None:
+                    continue  # Cancelled, go back to media type selection
+                shows, skipped = loaded
 
-            shows = requests.get(
-                f"{JELLYFIN_URL}/Users/{user_id}/Items?IncludeItemTypes=Series&Recursive=true",
-                headers=headers,
-            ).json()["Items"]
+                if not shows:
+                    cleanup()
+                    print("No shows found.")
+                    exit()
 
-            if not shows:
-                cleanup()
-                print("No shows found.")
-                exit()
+                selected_show = await select_from_list(
+                    shows, "TV Shows", 
+                    allow_escape_up=True,
+                    index=ListIndex(shows),
+                    notice=skipped_notice(skipped_logins + skipped),
+                )
+                if selected_show == -1:
+                    continue  # Go back to media type selection
+                # Seasons and episodes come from whichever server has the show
+                show = pick_source(shows[selected_show])
+                server = show["_server"]
+                show_id = show["Id"]
+                show_name = show["Name"]
+
+                # === GET SEASONS ===
+                stdscr.addstr(0, 0, "Loading seasons... (ESC to cancel)", curses.A_BOLD)
+                stdscr.refresh()
 
-            selected_show = select_from_list(
-                shows, "TV Shows", 
-                allow_escape_up=True,
-                headers=headers
-            )
-            if selected_show == -1:
-                continue  # Go back to media type selection
-            show_id = shows[selected_show]["Id"]
-            show_name = shows[selected_show]["Name"]
-
-            # === GET SEASONS ===
-            stdscr.addstr(0, 0, "Loading seasons...", curses.A_BOLD)
-            stdscr.refresh()
-
-            seasons = requests.get(
-                f"{JELLYFIN_URL}/Shows/{show_id}/Seasons", headers=headers
-            ).json()["Items"]
-
-            if not seasons:
-                cleanup()
-                print("No seasons found.")
-                exit()
+                seasons = await until_escape(server.get_items(f"/Shows/{show_id}/Seasons"))
+                if seasons is None:
+                    continue
 
-            selected_season = select_from_list(seasons, f"{show_name}", allow_escape_up=True)
-            if selected_season == -1:
-                continue  # Go back to shows list
-            season_id = seasons[selected_season]["Id"]
-            season_name = seasons[selected_season]["Name"]
+                if not seasons:
+                    cleanup()
+                    print("No seasons found.")
+                    exit()
 
-            # === EPISODE LOOP (stays in current season after playback) ===
-            while True:
-                stdscr.addstr(0, 0, "Loading episodes...", curses.A_BOLD)
+                selected_season = await select_from_list(seasons, f"{show_name}", allow_escape_up=True)
+                if selected_season == -1:
+                    continue  # Go back to shows list
+                season_id = seasons[selected_season]["Id"]
+                season_name = seasons[selected_season]["Name"]
+
+                stdscr.addstr(0, 0, "Loading episodes... (ESC to cancel)", curses.A_BOLD)
                 stdscr.refresh()
 
-                episodes = requests.get(
-                    f"{JELLYFIN_URL}/Shows/{show_id}/Episodes?seasonId={season_id}",
-                    headers=headers,
-                ).json()["Items"]
+                episodes = await until_escape(server.get_items(
+                    f"/Shows/{show_id}/Episodes?seasonId={season_id}&Fields={ITEM_FIELDS}"
+                ))
+                if episodes is None:
+                    continue  # Cancelled, go back to media type selection
 
                 if not episodes:
                     cleanup()
@@ -128,51 +122,77 @@ while True:
                     episode_number = episode.get("IndexNumber", 0)
                     episode["Name"] = f"{episode_number}. {episode['Name']}"
 
-                selected_episode = select_from_list(episodes, f"{season_name}", allow_escape_up=True)
-                if selected_episode == -1:
-                    break  # Exit episode loop, go back to season selection
-                
-                item_id = episodes[selected_episode]["Id"]
-                item_name = episodes[selected_episode]["Name"]
-
-                # Play the selected episode
-                play_item(item_id, item_name, token, headers, user_id)
-
-                # After playback, loop continues, showing the same season's episodes again
-        except Exception as e:
-            cleanup()
-            print(f"Error loading TV shows: {e}")
-            exit()
-
-    elif media_type == "Movie":
-        # === GET MOVIES ===
-        try:
-            stdscr.addstr(0, 0, "Loading movies...", curses.A_BOLD)
-            stdscr.refresh()
-
-            movies = requests.get(
-                f"{JELLYFIN_URL}/Users/{user_id}/Items?IncludeItemTypes=Movie&Recursive=true",
-                headers=headers,
-            ).json()["Items"]
-
-            if not movies:
+                # === EPISODE LOOP (stays in current season after playback) ===
+                episode_index = ListIndex(episodes)
+                while True:
+                    selected_episode = await select_from_list(
+                        episodes, f"{season_name}", allow_escape_up=True, index=episode_index
+                    )
+                    if selected_episode == -1:
+                        break  # Exit episode loop, go back to season selection
+
+                    item_name = episodes[selected_episode]["Name"]
+
+                    # Play the selected episode
+                    played = await play_item(episodes[selected_episode], item_name)
+
+                    # Keep watched/last played in step without reloading the season
+                    try:
+                        await refresh_user_data(episodes[selected_episode], played)
+                        episode_index.update(selected_episode)
+                    except Exception:
+                        pass
+                    # The show/season ticks are stale now too
+                    show_watch_cache.pop((server.url, show_id), None)
+
+                    # After playback, loop continues, showing the same season's episodes again
+            except Exception as e:
                 cleanup()
-                print("No movies found.")
+                print(f"Error loading TV shows: {e}")
                 exit()
 
-            while True:
-                selected_movie = select_from_list(movies, "Movies", allow_escape_up=True)
-                if selected_movie == -1:
-                    break  # Go back to media type selection
-                item_id = movies[selected_movie]["Id"]
-                item_name = movies[selected_movie]["Name"]
-                
-                # Play the selected movie
-                play_item(item_id, item_name, token, headers, user_id)
-                
-                # After playback, we'll return to the movies list
-                # because we're in the movies while loop
-        except Exception as e:
-            cleanup()
-            print(f"Error loading movies: {e}")
-            exit()
\ No newline at end of file
+        elif media_type == "Movie":
+            # === GET MOVIES ===
+            try:
+                stdscr.addstr(0, 0, "Loading movies... (ESC to cancel)", curses.A_BOLD)
+                stdscr.refresh()
+
+                loaded = await until_escape(fetch_library(servers, "Movie"))
+                if loaded is None:
+                    continue  # Cancelled, go back to media type selection
+                movies, skipped = loaded
+
+                if not movies:
+                    cleanup()
+                    print("No movies found.")
+                    exit()
+
+                movie_index = ListIndex(movies)
+                while True:
+                    selected_movie = await select_from_list(
+                        movies, "Movies", allow_escape_up=True, index=movie_index,
+                        notice=skipped_notice(skipped_logins + skipped),
+                    )
+                    if selected_movie == -1:
+                        break  # Go back to media type selection
+                    item_name = movies[selected_movie]["Name"]
+
+                    # Play the selected movie
+                    played = await play_item(movies[selected_movie], item_name)
+
+                    # Keep watched/last played in step without reloading the library
+                    try:
+                        await refresh_user_data(movies[selected_movie], played)
+                        movie_index.update(selected_movie)
+                    except Exception:
+                        pass
+
+                    # After playback, we'll return to the movies list
+                    # because we're in the movies while loop
+            except Exception as e:
+                cleanup()
+                print(f"Error loading movies: {e}")
+                exit()
+
+
+core.run(stdscr, browse())
@@ -4,40 +4,55 @@ import requests
 import tempfile
 import subprocess
 import time
-import socket
+import itertools
 import json
-import threading
+import signal
+import shutil
+import asyncio
 from .config import *
+from .servers import pick_source
+from . import core
+from .trickplay import load_intro, write_chapters, pick_trickplay, mpv_args, prepare_previews
 
-JELLYFIN_URL = "https://movies.meekcraft.net"
+PROGRESS_INTERVAL = 2  # seconds between progress reports
+IPC_TIMEOUT = 1  # seconds to wait for mpv to answer
 
 
-
-def play_item(item_id, item_name, token, headers, user_id):
+async def play_item(item, item_name):
     cleanup()  # Clean up curses before playback
+    core.pause_input()  # mpv gets the keyboard while it plays
 
+    ipc_path = preview_dir = mpv_proc = ipc_writer = None
+    progress_task = preview_task = None
     try:
-        stream_url = f"{JELLYFIN_URL}/Items/{item_id}/Download?api_key={token}"
+        # Play from the server that owns the item (or the fastest one that has it)
+        source = pick_source(item)
+        server = source["_server"]
+        item_id = source["Id"]
+        stream_url = f"{server.url}/Items/{item_id}/Download?api_key={server.token}"
 
         # === START PLAYBACK SESSION ===
-        requests.post(
-            f"{JELLYFIN_URL}/Sessions/Playing",
-            headers=headers,
-            json={
-                "ItemId": item_id,
-                "CanSeek": True,
-                "IsPaused": True,
-                "IsMuted": False,
-                "PlaybackStartTimeTicks": 0,
-                "PlayMethod": "DirectStream",
-            },
+        # Item info (with chapters and trickplay) and intro markers are
+        # fetched alongside the session start rather than after it
+        _, playback_res, intro = await asyncio.gather(
+            server.post(
+                "/Sessions/Playing",
+                json={
+                    "ItemId": item_id,
+                    "CanSeek": True,
+                    "IsPaused": True,
+                    "IsMuted": False,
+                    "PlaybackStartTimeTicks": 0,
+                    "PlayMethod": "DirectStream",
+                },
+            ),
+            server.get(f"/Users/{server.user_id}/Items/{item_id}"),
+            load_intro(server, item_id),
         )
 
         # === MPV IPC ===
         ipc_path = tempfile.NamedTemporaryFile(delete=False).name
-        playback_info = requests.get(
-            f"{JELLYFIN_URL}/Users/{user_id}/Items/{item_id}", headers=headers
-        ).json()
+        playback_info = playback_res.json()
 
         start_position_ticks = playback_info.get("UserData", {}).get(
             "PlaybackPositionTicks", 0
@@ -46,6 +61,16 @@ def play_item(item_id, item_name, token, headers, user_id):
             start_position_ticks // 10_000_000
         )  # Convert ticks to seconds
 
+        # === CHAPTERS / TRICKPLAY ===
+        # Chapters go to mpv as a file; trickplay sheets keep downloading and
+        # converting in the background while mpv is already playing
+        preview_dir = tempfile.mkdtemp(prefix="playfin-trickplay-")
+        trickplay = pick_trickplay(playback_info)
+        seek_args = mpv_args(write_chapters(preview_dir, playback_info), intro, trickplay, preview_dir)
+        preview_task = asyncio.ensure_future(prepare_previews(
+            server, item_id, trickplay, preview_dir, start_position_seconds
+        ))
+
         print(
             f"Starting playback of '{item_name}' from {start_position_seconds} seconds..."
         )
@@ -58,118 +83,157 @@ def play_item(item_id, item_name, token, headers, user_id):
                 # "--slang=en", # subs
                 # "--alang=ja", # audio
                 f"--start={start_position_seconds}",
-                "--fs"
+                "--fs",
+                *seek_args,
             ]
         )
 
-        import errno
-
-        sock = socket.socket(socket.AF_UNIX)
-
         timeout = time.time() + 5  # wait max 5 seconds
         while True:
             try:
-                if os.path.exists(ipc_path):
-                    sock.connect(ipc_path)
-                    break
-            except socket.error as e:
-                if e.errno != errno.ECONNREFUSED:
-                    raise
+                ipc_reader, ipc_writer = await asyncio.open_unix_connection(ipc_path)
+                break
+            except (ConnectionRefusedError, FileNotFoundError):
+                pass
             if time.time() > timeout:
                 raise TimeoutError(f"Could not connect to MPV IPC socket at {ipc_path}")
-            time.sleep(0.1)
-
-            def send_ipc_command(command):
-                try:
-                    msg = json.dumps({"command": command})
-                    sock.sendall((msg + "\n").encode())
-                    response = b""
-                    while not response.endswith(b"\n"):
-                        response += sock.recv(4096)
-                    return json.loads(response.decode())
-                except Exception as e:
-                    print(f"IPC command failed: {e}")
-                    return None
-        def get_position():
-            result = send_ipc_command(["get_property", "playback-time"])
+            await asyncio.sleep(0.1)
+
+        # mpv also pushes unsolicited events down the socket, so replies are
+        # matched on request_id; one command at a time
+        ipc_lock = asyncio.Lock()
+        ipc_ids = itertools.count(1)
+
+        async def read_reply(request_id):
+            while True:
+                line = await ipc_reader.readline()
+                if not line:
+                    return None  # mpv has gone away
+                reply = json.loads(line)
+                if reply.get("request_id") == request_id:
+                    return reply
+
+        async def send_ipc_command(command):
+            try:
+                async with ipc_lock:
+                    request_id = next(ipc_ids)
+                    msg = json.dumps({"command": command, "request_id": request_id})
+                    ipc_writer.write((msg + "\n").encode())
+                    await ipc_writer.drain()
+                    return await asyncio.wait_for(read_reply(request_id), IPC_TIMEOUT)
+            except Exception as e:
+                print(f"IPC command failed: {e}")
+                return None
+
+        async def get_position():
+            result = await send_ipc_command(["get_property", "playback-time"])
             if result and "data" in result and isinstance(result["data"], (int, float)):
                 return result["data"]
             return None
 
-        def get_playback_status():
-            result = send_ipc_command(["get_property", "pause"])
+        async def get_playback_status():
+            result = await send_ipc_command(["get_property", "pause"])
             if result and "data" in result and isinstance(result["data"], bool):
                 return not result["data"]  # Return True if playing, False if paused
             return None
 
         # === SIMPLE PROGRESS REPORTING ===
-        def report_progress():
+        # Once mpv has quit its socket only gives EOF, so the stop report
+        # falls back to the last position mpv told us about
+        last_pos = start_position_ticks / 10_000_000
+
+        async def report_progress():
+            nonlocal last_pos
             while mpv_proc.poll() is None:  # While MPV is running
                 try:
-                    current_pos = get_position()
+                    current_pos = await get_position()
                     if current_pos is not None:
+                        last_pos = current_pos
                         try:
-                            requests.post(
-                                f"{JELLYFIN_URL}/Sessions/Playing/Progress",
-                                headers=headers,
+                            await server.post(
+                                "/Sessions/Playing/Progress",
                                 json={
                                     "ItemId": item_id,
                                     "PositionTicks": int(current_pos * 10_000_000),
                                 },
-                                timeout=2,  # Short timeout to prevent hanging
+                                deadline=PROGRESS_INTERVAL,  # Never let reports pile up
                             )
                             print(
                                 f"↻ Current progress: {current_pos:.1f} seconds", end="\r"
                             )
-                        except requests.exceptions.RequestException as e:
+                        except (requests.exceptions.RequestException, asyncio.TimeoutError) as e:
                             print(f"⚠ Progress report failed: {e}")
-                    time.sleep(2)  # Report progress every 2 seconds
+                    await asyncio.sleep(PROGRESS_INTERVAL)
                 except Exception as e:
                     print(f"⚠ Unexpected error in progress reporting: {e}")
-                    time.sleep(2)
+                    await asyncio.sleep(PROGRESS_INTERVAL)
 
-        progress_thread = threading.Thread(target=report_progress, daemon=True)
-        progress_thread.start()
+        progress_task = asyncio.ensure_future(report_progress())
 
         # ^C fix so that jellyfin doesnt keep playing the progress
+        interrupted = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGINT, interrupted.set)
         try:
-            while mpv_proc.poll() is None:
-                time.sleep(0.1)
-        except KeyboardInterrupt:
+            while mpv_proc.poll() is None and not interrupted.is_set():
+                await asyncio.sleep(0.1)
+        finally:
+            loop.remove_signal_handler(signal.SIGINT)
+            progress_task.cancel()
+            preview_task.cancel()
+
+        if interrupted.is_set():
             print("\nCaught interrupt, stopping playback...")
             mpv_proc.terminate()
             try:
-                mpv_proc.wait(timeout=2)
+                await asyncio.to_thread(mpv_proc.wait, timeout=2)
             except subprocess.TimeoutExpired:
                 mpv_proc.kill()
 
         # === STOP SESSION ===
         try:
-            final_pos = get_position() or 0  # Default to 0 if None
-            requests.post(
-                f"{JELLYFIN_URL}/Sessions/Playing/Stopped",
-                headers=headers,
+            final_pos = await get_position()
+            if final_pos is None:
+                final_pos = last_pos
+            await server.post(
+                "/Sessions/Playing/Stopped",
                 json={
                     "ItemId": item_id,
                     "PositionTicks": int(final_pos * 10_000_000),
                     "MediaSourceId": item_id,
                 },
-                timeout=3
+                deadline=3
             )
             print(f"\n⏹ Playback stopped at position: {final_pos:.1f} seconds")
         except Exception as e:
             print(f"\n⚠ Failed to send stop notification: {e}")
-        sock.close()
-        try:
-            os.unlink(ipc_path)
-        except:
-            pass
 
     except Exception as e:
         print(f"\n⚠ Error during playback: {e}")
         cleanup()
         raise
 
+    finally:
+        # Also runs when playback failed part way, e.g. mpv never opened its socket
+        for task in (progress_task, preview_task):
+            if task:
+                task.cancel()
+        if preview_task:
+            # Lets sheet conversions finish writing before preview_dir goes
+            await asyncio.gather(preview_task, return_exceptions=True)
+        if mpv_proc and mpv_proc.poll() is None:
+            mpv_proc.terminate()
+        if ipc_writer:
+            ipc_writer.close()
+        if ipc_path:
+            try:
+                os.unlink(ipc_path)
+            except:
+                pass
+        # Converted previews are big and only useful while mpv runs
+        if preview_dir:
+            shutil.rmtree(preview_dir, ignore_errors=True)
+
     stdscr = curses.initscr()
     curses.noecho()
     curses.cbreak()
@@ -182,5 +246,6 @@ def play_item(item_id, item_name, token, headers, user_id):
         curses.init_pair(2, curses.COLOR_RED, curses.COLOR_BLACK)
         curses.init_pair(3, curses.COLOR_CYAN, curses.COLOR_BLACK)
         curses.init_pair(4, curses.COLOR_YELLOW, curses.COLOR_BLACK)
-    
-    return stdscr  # Return the new stdscr object
+
+    core.resume_input()
+    return source  # the copy that was played, for refresh_user_data
@@ -0,0 +1,316 @@
+import os
+import io
+import re
+import sys
+import base64
+import curses
+import fcntl
+import struct
+import termios
+import asyncio
+from .constants import POSTER_CACHE_DIR
+from .cache import MemoryCache, DiskCache
+from .servers import pick_source
+from .core import wake
+
+# Pillow is optional, without it there are simply no posters
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+DISK_CACHE_BYTES = 200 * 1024 * 1024
+MEMORY_CACHE_BYTES = 32 * 1024 * 1024
+DEFAULT_CELL_SIZE = (8, 16)  # pixels, when the terminal doesn't report it
+SIXEL_COLORS = 64
+SIXEL_MAX_SIZE = (320, 480)  # pixels; bigger posters are scaled down before encoding
+SIXEL_CHARS = bytes(63 + i if i < 64 else 0 for i in range(256))
+SIXEL_RUN = re.compile(r"(.)\1{3,}")
+KITTY_CHUNK = 4096
+POSTER_DEADLINE = 10  # seconds
+POSTER_MODES = ("kitty", "sixel", "halfblock")
+FIRST_POSTER_PAIR = 16  # leave the menu's own colour pairs alone
+HALFBLOCK_COLORS = 15  # 15 x 15 fg/bg combinations fit in the 240 pairs left over
+
+
+def detect_mode(setting="auto"):
+    if Image is None or setting == "off":
+        return None
+
+    # Anything that isn't a known mode (typos included) is treated as "auto"
+    mode = setting if setting in POSTER_MODES else None
+    if mode is None:
+        term = os.environ.get("TERM", "")
+        if "KITTY_WINDOW_ID" in os.environ or "kitty" in term:
+            mode = "kitty"
+        elif "sixel" in term or term.startswith(("mlterm", "foot", "yaft")):
+            mode = "sixel"
+        else:
+            mode = "halfblock"
+
+    if mode == "halfblock" and not (curses.has_colors() and curses.COLORS >= 8):
+        return None
+    return mode
+
+
+def cell_size():
+    try:
+        rows, cols, xpixel, ypixel = struct.unpack(
+            "HHHH", fcntl.ioctl(sys.stdout.fileno(), termios.TIOCGWINSZ, b"\0" * 8)
+        )
+        if rows and cols and xpixel and ypixel:
+            return xpixel // cols, ypixel // rows
+    except OSError:
+        pass
+    return DEFAULT_CELL_SIZE
+
+
+def encode_kitty(image, image_id):
+    # Transmit only (a=t); the image is placed later by id, so redraws don't
+    # have to send the whole PNG again
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+    data = base64.standard_b64encode(buf.getvalue()).decode()
+    chunks = [data[i:i + KITTY_CHUNK] for i in range(0, len(data), KITTY_CHUNK)]
+
+    out = []
+    for i, chunk in enumerate(chunks):
+        more = 1 if i < len(chunks) - 1 else 0
+        if i == 0:
+            out.append(f"\x1b_Ga=t,i={image_id},f=100,q=2,m={more};{chunk}\x1b\\")
+        else:
+            out.append(f"\x1b_Gm={more};{chunk}\x1b\\")
+    return "".join(out)
+
+
+def sixel_bands(indices, width, height):
+    # indices holds one palette index per pixel, row by row. Everything per
+    # pixel is done with bytes.translate and big-int adds, so the Python-level
+    # loop only runs per band and colour.
+    tables = {}
+    out = []
+    for top in range(0, height, 6):
+        rows = [indices[y * width:(y + 1) * width] for y in range(top, min(top + 6, height))]
+        colours = set()
+        for row in rows:
+            colours.update(row)
+
+        for colour in sorted(colours):
+            # Each row contributes its own bit, so adding never carries
+            bits = 0
+            for dy, row in enumerate(rows):
+                table = tables.get((colour, dy))
+                if table is None:
+                    table = tables[(colour, dy)] = bytes(
+                        1 << dy if i == colour else 0 for i in range(256)
+                    )
+                bits += int.from_bytes(row.translate(table), "big")
+
+            line = bits.to_bytes(width, "big").translate(SIXEL_CHARS).decode()
+            line = SIXEL_RUN.sub(lambda m: f"!{len(m.group())}{m.group(1)}", line)
+            out.append(f"#{colour}{line}$")
+        out.append("-")
+    return "".join(out)
+
+
+def encode_sixel(image):
+    image = image.copy()
+    image.thumbnail(SIXEL_MAX_SIZE)
+    image = image.quantize(colors=SIXEL_COLORS)
+    palette = image.getpalette()[:SIXEL_COLORS * 3]
+    width, height = image.size
+
+    out = ["\x1bPq", f'"1;1;{width};{height}']
+    for i in range(len(palette) // 3):
+        r, g, b = palette[i * 3:i * 3 + 3]
+        out.append(f"#{i};2;{r * 100 // 255};{g * 100 // 255};{b * 100 // 255}")
+    out.append(sixel_bands(image.tobytes(), width, height))
+    out.append("\x1b\\")
+    return "".join(out)
+
+
+class PosterLoader:
+    # Posters are fetched as tasks on the event loop and decoded/downscaled in
+    # a worker thread, so the menu only ever draws what is already in the
+    # memory cache.
+    def __init__(self, mode):
+        self.mode = mode
+        self.memory = MemoryCache(MEMORY_CACHE_BYTES)
+        self.disk = DiskCache(POSTER_CACHE_DIR, DISK_CACHE_BYTES)
+        self.tasks = {}
+        self.pairs = {}  # (fg, bg) -> pair number, for the poster on screen
+        self.allocated = {}  # fg + bg cube steps -> pair, for those that got their own
+        self.next_pair = FIRST_POSTER_PAIR
+        self.paired = None  # payload the pairs above were set up for
+        # curses.color_pair() keeps only 8 bits of the pair number, anything
+        # above 255 would draw with the wrong colours
+        self.max_pairs = min(curses.COLOR_PAIRS, 256)
+        self.next_image_id = 1
+        self.transmitted = set()  # kitty image ids the terminal already has
+
+        if mode == "halfblock":
+            # More colour combinations than pairs is fine, see _pair
+            self.levels = 6 if curses.COLORS >= 256 else 2
+
+    def _job(self, item, cols, rows):
+        if "_server" not in item:
+            return None
+        source = pick_source(item)
+        tag = source.get("ImageTags", {}).get("Primary")
+        if not tag:
+            return None
+
+        if self.mode == "halfblock":
+            width, height = cols, rows * 2
+        else:
+            cell_width, cell_height = cell_size()
+            width, height = cols * cell_width, rows * cell_height
+
+        server = source["_server"]
+        key = (server.url, source["Id"], tag, self.mode, cols, rows)
+        return key, server, source["Id"], tag, width, height
+
+    def request(self, item, cols, rows, scope, prefetch=()):
+        # Returns the poster if it is ready, otherwise starts loading it (and
+        # its neighbours) in scope and returns None; wake() fires once it lands.
+        job = self._job(item, cols, rows)
+        payload = self.memory.get(job[0]) if job else None
+
+        jobs = [job] if job and payload is None else []
+        for other in prefetch:
+            other_job = self._job(other, cols, rows)
+            if other_job and self.memory.get(other_job[0]) is None:
+                jobs.append(other_job)
+
+        # Anything else still loading has scrolled out of view
+        wanted = {job[0] for job in jobs}
+        for key, task in list(self.tasks.items()):
+            if key not in wanted:
+                task.cancel()
+                del self.tasks[key]
+
+        if scope:
+            for job in jobs:
+                task = self.tasks.get(job[0])
+                if task is None or task.done():
+                    self.tasks[job[0]] = scope.spawn(self._load(*job))
+        return payload
+
+    async def _load(self, key, server, item_id, tag, width, height):
+        try:
+            disk_key = (server.url, item_id, tag, width, height)
+            data = await asyncio.to_thread(self.disk.get, disk_key)
+            if data is None:
+                res = await server.get(
+                    f"/Items/{item_id}/Images/Primary?maxWidth={width}&maxHeight={height}&tag={tag}",
+                    deadline=POSTER_DEADLINE,
+                )
+                res.raise_for_status()
+                data = res.content
+                await asyncio.to_thread(self.disk.put, disk_key, data)
+
+            image_id = self.next_image_id
+            self.next_image_id += 1
+            payload, size = await asyncio.to_thread(self._render, data, width, height, image_id)
+            self.memory.put(key, payload, size)
+            wake()
+        finally:
+            if self.tasks.get(key) is asyncio.current_task():
+                del self.tasks[key]
+
+    def _render(self, data, width, height, image_id):
+        image = Image.open(io.BytesIO(data)).convert("RGB")
+        image.thumbnail((width, height))
+
+        if self.mode == "kitty":
+            transmit = encode_kitty(image, image_id)
+            return (image_id, transmit), len(transmit)
+        if self.mode == "sixel":
+            payload = encode_sixel(image)
+            return payload, len(payload)
+        payload = self._halfblocks(image.quantize(colors=HALFBLOCK_COLORS).convert("RGB"))
+        return payload, len(payload) * image.width * 16
+
+    def _halfblocks(self, image):
+        # Each cell is "▀": top pixel as foreground, bottom pixel as background
+        pixels = image.load()
+        width, height = image.size
+        rows = []
+        for y in range(0, height - 1, 2):
+            rows.append([
+                (self._colour(pixels[x, y]), self._colour(pixels[x, y + 1]))
+                for x in range(width)
+            ])
+        return rows
+
+    def _colour(self, pixel):
+        r, g, b = (round(value * (self.levels - 1) / 255) for value in pixel)
+        if curses.COLORS >= 256:
+            step = 5 / (self.levels - 1)
+            return 16 + 36 * round(r * step) + 6 * round(g * step) + round(b * step)
+        return r + 2 * g + 4 * b  # curses.COLOR_RED/GREEN/BLUE are 1/2/4
+
+    def _rgb(self, colour):
+        # Inverse of _colour, in steps of the colour cube
+        if curses.COLORS >= 256:
+            colour -= 16
+            return colour // 36, colour // 6 % 6, colour % 6
+        return colour & 1, colour >> 1 & 1, colour >> 2 & 1
+
+    def _pair(self, fg, bg):
+        if (fg, bg) not in self.pairs:
+            if self.next_pair < self.max_pairs:
+                curses.init_pair(self.next_pair, fg, bg)
+                self.allocated[self._rgb(fg) + self._rgb(bg)] = self.next_pair
+                self.pairs[(fg, bg)] = self.next_pair
+                self.next_pair += 1
+            elif self.allocated:
+                # Out of pairs (small terminals): reuse the closest one this
+                # poster already has
+                wanted = self._rgb(fg) + self._rgb(bg)
+                closest = min(
+                    self.allocated,
+                    key=lambda rgb: sum((a - b) ** 2 for a, b in zip(rgb, wanted)),
+                )
+                self.pairs[(fg, bg)] = self.allocated[closest]
+            else:
+                return 0
+        return self.pairs[(fg, bg)]
+
+    def draw(self, stdscr, payload, y, x):
+        if self.mode == "halfblock":
+            # Only one poster is on screen at a time, so each one starts over
+            # with the whole range of pairs
+            if payload is not self.paired:
+                self.pairs.clear()
+                self.allocated.clear()
+                self.next_pair = FIRST_POSTER_PAIR
+                self.paired = payload
+            for row, cells in enumerate(payload):
+                for col, (fg, bg) in enumerate(cells):
+                    try:
+                        stdscr.addstr(y + row, x + col, "▀", curses.color_pair(self._pair(fg, bg)))
+                    except curses.error:
+                        pass
+            stdscr.refresh()
+        elif self.mode == "kitty":
+            # Send the image data the first time only, afterwards just place it
+            image_id, transmit = payload
+            stdscr.refresh()
+            self.clear()
+            if image_id not in self.transmitted:
+                sys.stdout.write(transmit)
+                self.transmitted.add(image_id)
+            sys.stdout.write(f"\x1b[{y + 1};{x + 1}H\x1b_Ga=p,i={image_id},p=1,C=1,q=2\x1b\\")
+            sys.stdout.flush()
+        else:
+            # Graphics go straight to the terminal, after curses has flushed
+            stdscr.refresh()
+            sys.stdout.write(f"\x1b[{y + 1};{x + 1}H{payload}")
+            sys.stdout.flush()
+
+    def clear(self):
+        if self.mode == "kitty":
+            # Removes placements only; transmitted image data stays for reuse
+            sys.stdout.write("\x1b_Ga=d,d=a,q=2\x1b\\")
+            sys.stdout.flush()
@@ -0,0 +1,222 @@
+import os
+import time
+import asyncio
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+POOL_SIZE = 8  # connections kept open per server
+DEFAULT_DEADLINE = 15  # seconds, total per request
+READ_CHUNK = 64 * 1024
+LIBRARY_TYPES = {
+    "Movie": ("movies", "mixed", None),
+    "Series": ("tvshows", "mixed", None),
+}
+PROVIDER_KEYS = ("Imdb", "Tmdb", "Tvdb")
+ITEM_FIELDS = "ProviderIds,DateCreated,Genres,SortName"  # needed for de-duplication and sorting
+
+
+class Server:
+    def __init__(self, url, username, password):
+        self.url = url.rstrip("/")
+        self.username = username
+        self.password = password
+        self.token = None
+        self.user_id = None
+        self.latency = float("inf")  # seconds, smoothed over requests
+
+        # Each server gets its own pool so a slow one can't starve the others
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.slots = asyncio.Semaphore(POOL_SIZE)
+
+        device_id = os.uname().nodename
+        device = os.uname().sysname
+        auth_header = f'MediaBrowser Client="playfin", Device="{device}", DeviceId="{device_id}", Version="0.1"'
+        self.headers = {"Authorization": auth_header}
+
+    def _timed(self, method, path, deadline, stop, kwargs):
+        # Runs in a worker thread. The body is read in chunks so a request
+        # that was abandoned (stop set) or ran past its total deadline is
+        # closed instead of being downloaded to the end.
+        start = time.monotonic()
+        res = self.session.request(
+            method, f"{self.url}{path}", headers=self.headers,
+            timeout=deadline, stream=True, **kwargs
+        )
+        try:
+            chunks = []
+            for chunk in res.iter_content(READ_CHUNK):
+                if stop.is_set() or time.monotonic() - start > deadline:
+                    raise requests.exceptions.Timeout(f"Request to {self.url}{path} abandoned")
+                chunks.append(chunk)
+            res._content = b"".join(chunks)
+        finally:
+            res.close()
+
+        elapsed = time.monotonic() - start
+        if self.latency == float("inf"):
+            self.latency = elapsed
+        else:
+            self.latency = 0.8 * self.latency + 0.2 * elapsed
+        return res
+
+    async def request(self, method, path, deadline=DEFAULT_DEADLINE, **kwargs):
+        # requests is blocking, so it runs in a worker thread. The slot is only
+        # given back once that thread is really done, so a cancelled request
+        # still counts against POOL_SIZE until it has stopped.
+        await self.slots.acquire()
+        stop = threading.Event()
+        try:
+            future = asyncio.get_running_loop().run_in_executor(
+                None, self._timed, method, path, deadline, stop, kwargs
+            )
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(self._finished)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), deadline)
+        except BaseException:
+            # Cancelled or past the deadline: tell the thread to give up
+            stop.set()
+            raise
+
+    def _finished(self, future):
+        self.slots.release()
+        if not future.cancelled():
+            future.exception()  # nobody may be waiting for it any more
+
+    async def get(self, path, **kwargs):
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request("POST", path, **kwargs)
+
+    async def get_items(self, path, **kwargs):
+        items = (await self.get(path, **kwargs)).json().get("Items", [])
+        for item in items:
+            item["_server"] = self
+        return items
+
+    async def login(self):
+        auth_res = await self.post(
+            "/Users/AuthenticateByName",
+            json={"Username": self.username, "Pw": self.password},
+        )
+
+        if auth_res.status_code != 200:
+            raise Exception(f"Login failed for {self.url}")
+
+        data = auth_res.json()
+        self.token = data["AccessToken"]
+        self.user_id = data["User"]["Id"]
+        self.headers["X-Emby-Token"] = self.token
+        return self
+
+
+async def login_all(servers):
+    # Log in everywhere at once, keep whichever servers answered. Returns
+    # (logged in servers, urls of the ones that didn't)
+    results = await asyncio.gather(
+        *(server.login() for server in servers), return_exceptions=True
+    )
+    logged_in = [result for result in results if isinstance(result, Server)]
+    errors = [str(result) for result in results if isinstance(result, Exception)]
+
+    if not logged_in:
+        raise Exception("; ".join(errors) or "No servers configured")
+    skipped = [server.url for server in servers if server not in logged_in]
+    return logged_in, skipped
+
+
+async def get_libraries(server, media_type):
+    views = (await server.get(f"/Users/{server.user_id}/Views")).json().get("Items", [])
+    return [
+        view for view in views
+        if view.get("CollectionType") in LIBRARY_TYPES[media_type]
+    ]
+
+
+async def fetch_server_library(server, media_type):
+    libraries = await get_libraries(server, media_type)
+    return await asyncio.gather(*(
+        server.get_items(
+            f"/Users/{server.user_id}/Items?ParentId={library['Id']}"
+            f"&IncludeItemTypes={media_type}&Recursive=true&Fields={ITEM_FIELDS}"
+        )
+        for library in libraries
+    ), return_exceptions=True)
+
+
+async def fetch_library(servers, media_type):
+    # Every library on every server is fetched at once; a server or library
+    # that fails (or misses its deadline) is left out. Returns (items, urls
+    # of the servers that were left out in whole or in part), and only
+    # raises when nothing could be loaded at all.
+    per_server = await asyncio.gather(
+        *(fetch_server_library(server, media_type) for server in servers),
+        return_exceptions=True,
+    )
+
+    results = []
+    errors = []
+    skipped = []
+    for server, libraries in zip(servers, per_server):
+        if isinstance(libraries, Exception):
+            libraries = [libraries]
+        failed = [str(items) for items in libraries if isinstance(items, Exception)]
+        results.extend(items for items in libraries if not isinstance(items, Exception))
+        if failed:
+            errors += [f"{server.url}: {error}" for error in failed]
+            skipped.append(server.url)
+
+    if errors and not results:
+        raise Exception("; ".join(errors))
+    return merge_items(results), skipped
+
+
+def dedupe_key(item):
+    provider_ids = item.get("ProviderIds") or {}
+    for provider in PROVIDER_KEYS:
+        if provider_ids.get(provider):
+            return (item.get("Type"), provider, provider_ids[provider])
+    return (item.get("Type"), item["Name"].lower(), item.get("ProductionYear"))
+
+
+def sort_key(item):
+    return (item.get("SortName") or item["Name"]).lower()
+
+
+def merge_items(item_lists):
+    merged = {}
+    for items in item_lists:
+        for item in items:
+            key = dedupe_key(item)
+            if key in merged:
+                existing = merged[key]
+                if item["Id"] not in (source["Id"] for source in existing["_sources"]):
+                    existing["_sources"].append(item)
+            else:
+                merged[key] = dict(item, _sources=[item])
+
+    return sorted(merged.values(), key=sort_key)
+
+
+def pick_source(item):
+    # Same item on more than one server: use the one that has been answering fastest
+    return min(item.get("_sources", [item]), key=lambda source: source["_server"].latency)
+
+
+async def refresh_user_data(item, source=None):
+    # Pull fresh watch status for an item after it has been played, from the
+    # source that was played (latencies may have changed since it was picked)
+    source = source or pick_source(item)
+    server = source["_server"]
+    user_data = (await server.get(f"/Users/{server.user_id}/Items/{source['Id']}")).json().get("UserData", {})
+    source["UserData"] = user_data
+    item["UserData"] = user_data
+    return item
@@ -0,0 +1,275 @@
+import os
+import io
+import json
+import asyncio
+from .constants import TRICKPLAY_CACHE_DIR
+from .cache import DiskCache
+
+# Pillow is optional, without it there are chapters but no seek previews
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+TICKS_PER_SECOND = 10_000_000
+PREVIEW_WIDTH = 160  # pixels; previews are handed to mpv as raw BGRA so keep them small
+SEGMENT_DEADLINE = 3  # seconds, playback shouldn't wait long for intro markers
+SHEET_DEADLINE = 10
+SHEET_WORKERS = 2  # sheets fetched at once, leaving server slots for progress reports
+SHEET_CACHE_BYTES = 200 * 1024 * 1024
+SHEET_CACHE_DIR = os.path.join(TRICKPLAY_CACHE_DIR, "sheets")
+INTRO_CACHE_BYTES = 1024 * 1024
+INTRO_CACHE_DIR = os.path.join(TRICKPLAY_CACHE_DIR, "intros")
+
+# Loaded into mpv with --script. Shows the trickplay thumbnail for the seek
+# target and lets TAB jump past the intro.
+LUA_SCRIPT = r"""
+local opts = {
+    dir = "",
+    width = 0, height = 0, tiles_x = 0, tiles_y = 0, interval = 0, count = 0,
+    intro_start = -1, intro_end = -1,
+}
+require("mp.options").read_options(opts, "playfin")
+
+local hide_timer = nil
+
+local function show_preview()
+    local pos = mp.get_property_number("time-pos")
+    if opts.count == 0 or pos == nil then return end
+
+    local n = math.min(math.floor(pos * 1000 / opts.interval), opts.count - 1)
+    local per_sheet = opts.tiles_x * opts.tiles_y
+    local sheet = math.floor(n / per_sheet)
+    local tile = n % per_sheet
+
+    -- Sheets are still being prepared in the background; skip until they land
+    local path = opts.dir .. "/" .. sheet .. ".bgra"
+    local f = io.open(path, "rb")
+    if not f then return end
+    f:close()
+
+    local stride = opts.tiles_x * opts.width * 4
+    local row = math.floor(tile / opts.tiles_x)
+    local col = tile % opts.tiles_x
+    local offset = row * opts.height * stride + col * opts.width * 4
+    local osd_w, osd_h = mp.get_osd_size()
+    mp.command_native({
+        "overlay-add", 1,
+        math.floor((osd_w - opts.width) / 2), osd_h - opts.height - 60,
+        path, offset, "bgra", opts.width, opts.height, stride,
+    })
+
+    if hide_timer then hide_timer:kill() end
+    hide_timer = mp.add_timeout(1.5, function()
+        mp.command_native({"overlay-remove", 1})
+    end)
+end
+
+mp.register_event("seek", show_preview)
+
+local intro_announced = false
+
+mp.add_key_binding("TAB", "playfin-skip-intro", function()
+    if opts.intro_end > 0 then
+        mp.commandv("seek", opts.intro_end, "absolute+exact")
+    end
+end)
+
+mp.observe_property("time-pos", "number", function(_, pos)
+    if pos and not intro_announced and opts.intro_end > 0
+        and pos >= opts.intro_start and pos < opts.intro_end then
+        intro_announced = true
+        mp.osd_message("Intro - press TAB to skip", 3)
+    end
+end)
+"""
+
+
+async def load_intro(server, item_id):
+    # (start, end) in seconds, or None. Found intros are kept on disk; "no
+    # intro" isn't, since the server may still detect one later. Runs next to
+    # the session start, so nothing in here may fail playback.
+    intro_key = (server.url, item_id)
+    try:
+        intros = DiskCache(INTRO_CACHE_DIR, INTRO_CACHE_BYTES)
+    except OSError:
+        intros = None
+
+    cached = await asyncio.to_thread(intros.get, intro_key) if intros else None
+    if cached is not None:
+        try:
+            return json.loads(cached)["intro"]
+        except (ValueError, KeyError):
+            pass
+
+    try:
+        # Media segments only exist on newer servers; no intro is fine
+        res = await server.get(
+            f"/MediaSegments/{item_id}?includeSegmentTypes=Intro",
+            deadline=SEGMENT_DEADLINE,
+        )
+        res.raise_for_status()
+        for segment in res.json().get("Items", []):
+            if segment.get("Type") == "Intro":
+                intro = [
+                    segment["StartTicks"] / TICKS_PER_SECOND,
+                    segment["EndTicks"] / TICKS_PER_SECOND,
+                ]
+                break
+        else:
+            return None
+    except Exception:
+        return None
+
+    if intros:
+        try:
+            await asyncio.to_thread(intros.put, intro_key, json.dumps({"intro": intro}).encode())
+        except OSError:
+            pass
+    return intro
+
+
+def escape_ffmetadata(text):
+    for char in ("\\", "=", ";", "#", "\n"):
+        text = text.replace(char, "\\" + char)
+    return text
+
+
+def write_chapters(directory, item):
+    chapters = item.get("Chapters") or []
+    if not chapters:
+        return None
+
+    lines = [";FFMETADATA1"]
+    for i, chapter in enumerate(chapters):
+        start = chapter.get("StartPositionTicks", 0)
+        if i + 1 < len(chapters):
+            end = chapters[i + 1].get("StartPositionTicks", start)
+        else:
+            end = item.get("RunTimeTicks") or start
+        lines += [
+            "[CHAPTER]",
+            f"TIMEBASE=1/{TICKS_PER_SECOND}",
+            f"START={start}",
+            f"END={end}",
+            f"title={escape_ffmetadata(chapter.get('Name') or f'Chapter {i + 1}')}",
+        ]
+
+    path = os.path.join(directory, "chapters.ffmeta")
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+
+def pick_trickplay(item):
+    # Smallest trickplay resolution the server generated for this item
+    sources = item.get("Trickplay") or {}
+    media_source_id = item["Id"] if item["Id"] in sources else next(iter(sources), None)
+    if media_source_id is None or not sources[media_source_id]:
+        return None
+
+    widths = sources[media_source_id]
+    width = min(widths, key=int)
+    info = widths[width]
+    scale = min(1, PREVIEW_WIDTH / info["Width"])
+    return dict(
+        info,
+        MediaSourceId=media_source_id,
+        Resolution=width,
+        PreviewWidth=round(info["Width"] * scale),
+        PreviewHeight=round(info["Height"] * scale),
+    )
+
+
+def mpv_args(chapters_path, intro, trickplay, preview_dir):
+    args = []
+    if chapters_path:
+        args.append(f"--chapters-file={chapters_path}")
+
+    opts = {"dir": preview_dir}
+    if intro:
+        opts["intro_start"], opts["intro_end"] = intro
+    if trickplay and Image is not None:
+        opts.update(
+            width=trickplay["PreviewWidth"],
+            height=trickplay["PreviewHeight"],
+            tiles_x=trickplay["TileWidth"],
+            tiles_y=trickplay["TileHeight"],
+            interval=trickplay["Interval"],
+            count=trickplay["ThumbnailCount"],
+        )
+
+    script_path = os.path.join(TRICKPLAY_CACHE_DIR, "playfin.lua")
+    os.makedirs(TRICKPLAY_CACHE_DIR, exist_ok=True)
+    with open(script_path, "w") as f:
+        f.write(LUA_SCRIPT)
+
+    args.append(f"--script={script_path}")
+    # Appended one by one so script-opts from the user's mpv.conf survive
+    args += [f"--script-opts-append=playfin-{key}={value}" for key, value in opts.items()]
+    return args
+
+
+def sheet_to_bgra(data, trickplay, path):
+    tiles_x, tiles_y = trickplay["TileWidth"], trickplay["TileHeight"]
+    width, height = trickplay["PreviewWidth"], trickplay["PreviewHeight"]
+
+    sheet = Image.open(io.BytesIO(data)).convert("RGBA")
+    # The last sheet may have fewer rows, so it goes on a full size canvas
+    cols = max(1, round(sheet.width / trickplay["Width"]))
+    rows = max(1, round(sheet.height / trickplay["Height"]))
+    canvas = Image.new("RGBA", (tiles_x * width, tiles_y * height))
+    canvas.paste(sheet.resize((cols * width, rows * height)), (0, 0))
+
+    # Written under a temporary name so the mpv script never sees half a file
+    with open(path + ".tmp", "wb") as f:
+        f.write(canvas.tobytes("raw", "BGRA"))
+    os.replace(path + ".tmp", path)
+
+
+async def prepare_sheet(server, item_id, trickplay, index, sheets, preview_dir):
+    sheet_key = (server.url, item_id, trickplay["Resolution"], index)
+    data = await asyncio.to_thread(sheets.get, sheet_key)
+    if data is None:
+        res = await server.get(
+            f"/Videos/{item_id}/Trickplay/{trickplay['Resolution']}/{index}.jpg"
+            f"?mediaSourceId={trickplay['MediaSourceId']}",
+            deadline=SHEET_DEADLINE,
+        )
+        res.raise_for_status()
+        data = res.content
+        await asyncio.to_thread(sheets.put, sheet_key, data)
+
+    # The worker thread can't be stopped part way; when cancelled, wait for it
+    # anyway so preview_dir can be removed safely afterwards
+    convert = asyncio.ensure_future(asyncio.to_thread(
+        sheet_to_bgra, data, trickplay, os.path.join(preview_dir, f"{index}.bgra")
+    ))
+    try:
+        await asyncio.shield(convert)
+    except asyncio.CancelledError:
+        await asyncio.wait([convert])
+        raise
+
+
+async def prepare_previews(server, item_id, trickplay, preview_dir, start_seconds=0):
+    # Runs alongside playback; sheets closest to the start position come first
+    if not trickplay or Image is None:
+        return
+
+    # Downloaded sheets are shared across items in one size-bounded cache
+    cache = DiskCache(SHEET_CACHE_DIR, SHEET_CACHE_BYTES)
+    per_sheet = trickplay["TileWidth"] * trickplay["TileHeight"]
+    sheet_count = -(-trickplay["ThumbnailCount"] // per_sheet)
+    start_sheet = int(start_seconds * 1000 // trickplay["Interval"]) // per_sheet
+    order = sorted(range(sheet_count), key=lambda index: abs(index - start_sheet))
+
+    # A few at a time, strictly in order, so the nearest sheets land first and
+    # the playback reports never queue behind a burst of downloads
+    workers = asyncio.Semaphore(SHEET_WORKERS)
+
+    async def fetch(index):
+        async with workers:
+            await prepare_sheet(server, item_id, trickplay, index, cache, preview_dir)
+
+    await asyncio.gather(*(fetch(index) for index in order), return_exceptions=True)
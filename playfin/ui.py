@@ -1,9 +1,14 @@
 import curses
 import os
 from .constants import CONFIG_FILE
-from .cache import get_cached_show_status, get_cached_season_status
+from .cache import get_cached_show_status, get_cached_season_status, cache_show_watch_status
+from .posters import PosterLoader, detect_mode
+from .core import Scope, get_key, wake, WAKE, ESC
 
-JELLYFIN_URL = "https://movies.meekcraft.net"
+MIN_POSTER_WIDTH = 80  # below this the terminal is too narrow for a poster pane
+
+posters = None
+active_scope = None  # background work for the list currently on screen
 
 
 def init_curses():
@@ -60,20 +65,84 @@ def get_input(stdscr, prompt, hidden=False):
     return input_str
 
 
+def enable_posters(setting="auto"):
+    global posters
+    mode = detect_mode(setting)
+    posters = PosterLoader(mode) if mode else None
+
+
+def poster_pane():
+    # (y, x, cols, rows) of the poster area, or None when there is no room
+    h, w = stdscr.getmaxyx()
+    if not posters or w < MIN_POSTER_WIDTH:
+        return None
+    cols = w // 3
+    return 2, w - cols - 3, cols, h - 4
+
+
+def draw_poster(items, selected_index):
+    pane = poster_pane()
+    if not pane or not items:
+        return
+    y, x, cols, rows = pane
+    neighbours = items[max(0, selected_index - 1):selected_index] + items[selected_index + 1:selected_index + 2]
+    payload = posters.request(items[selected_index], cols, rows, active_scope, prefetch=neighbours)
+    if payload is not None:
+        posters.draw(stdscr, payload, y, x)
+
+
 def cleanup():
+    if posters:
+        posters.clear()
     curses.nocbreak()
     stdscr.keypad(False)
     curses.echo()
     curses.endwin()
 
-def display_menu(items, title, selected_index=0, status_msg="", headers=None):
+async def load_watch_status(show_id, server):
+    await cache_show_watch_status(show_id, server)
+    wake()
+
+
+def visible_range(count, selected_index):
+    h, w = stdscr.getmaxyx()
+    max_visible_items = h - 4  # Leave space for title and status message
+    start_index = max(0, selected_index - max_visible_items + 1)
+    return start_index, min(count, start_index + max_visible_items)
+
+
+def status_lookup(item):
+    # (show_id, server) whose episodes decide this item's tick, or None
+    server = item.get("_server")
+    user_data = item.get("UserData", {})
+    if not server or "Id" not in item:
+        return None
+    if user_data.get("Played", False) or user_data.get("PlaybackPositionTicks", 0) > 0:
+        return None
+    if item.get("Type") == "Series":
+        return item["Id"], server
+    if item.get("Type") == "Season":
+        return item.get("SeriesId", ""), server
+    return None
+
+
+def skipped_notice(urls):
+    # Status line note for servers whose items are missing from a list
+    if not urls:
+        return ""
+    return f"⚠ Couldn't load from {', '.join(dict.fromkeys(urls))}"
+
+
+def display_menu(items, title, selected_index=0, status_msg=""):
+    if posters:
+        posters.clear()
     stdscr.clear()
     h, w = stdscr.getmaxyx()
+    pane = poster_pane()
+    text_width = pane[1] - 3 if pane else w - 4
 
     # Calculate the visible range of items
-    max_visible_items = h - 4  # Leave space for title and status message
-    start_index = max(0, selected_index - max_visible_items + 1)
-    end_index = min(len(items), start_index + max_visible_items)
+    start_index, end_index = visible_range(len(items), selected_index)
 
     # Draw title
     if curses.has_colors():
@@ -88,7 +157,7 @@ def display_menu(items, title, selected_index=0, status_msg="", headers=None):
         actual_idx = start_index + idx
         item_text = (
             f"> {item['Name']}" if actual_idx == selected_index else f"  {item['Name']}"
-        )
+        )[:text_width]
         stdscr.addstr(
             idx + 2,
             2,
@@ -98,30 +167,24 @@ def display_menu(items, title, selected_index=0, status_msg="", headers=None):
 
     stdscr.refresh()  # Show initial draw quickly
 
-    # Second pass: add status indicators (slower but now visible)
+    # Second pass: add status indicators
     for idx, item in enumerate(items[start_index:end_index]):
         actual_idx = start_index + idx
         user_data = item.get("UserData", {})
         is_watched = user_data.get("Played", False)
         is_partial = not is_watched and user_data.get("PlaybackPositionTicks", 0) > 0
 
-        # Get status from cache if needed
-        if "Id" in item and not (is_watched or is_partial):
-            if item.get("Type") == "Series":
-                status = get_cached_show_status(item["Id"], headers, JELLYFIN_URL)
-                has_watched = status["watched"]
-                has_partial = status["partial"]
-            elif item.get("Type") == "Season":
-                status = get_cached_season_status(item.get("SeriesId", ""), item["Id"], headers, JELLYFIN_URL)
-                has_watched = status["watched"]
-                has_partial = status["partial"]
-        
-            else:
-                has_watched = False
-                has_partial = False
-        else:
-            has_watched = False
-            has_partial = False
+        # Get status from cache if needed; select_from_list starts the
+        # lookups and the menu redraws once they arrive
+        status = None
+        lookup = status_lookup(item)
+        if lookup and item.get("Type") == "Series":
+            status = get_cached_show_status(*lookup)
+        elif lookup:
+            status = get_cached_season_status(lookup[0], item["Id"], lookup[1])
+
+        has_watched = bool(status and status["watched"])
+        has_partial = bool(status and status["partial"])
 
         # Determine final status
         if is_watched:
@@ -146,7 +209,7 @@ def display_menu(items, title, selected_index=0, status_msg="", headers=None):
                 f"> {item['Name']}"
                 if actual_idx == selected_index
                 else f"  {item['Name']}"
-            )
+            )[:text_width]
             attr = curses.A_REVERSE if actual_idx == selected_index else 0
             stdscr.addstr(idx + 2, 2, item_text, attr | curses.color_pair(color))
 
@@ -159,6 +222,7 @@ def display_menu(items, title, selected_index=0, status_msg="", headers=None):
 
     # Status message
     if status_msg:
+        status_msg = status_msg[:w - 1]  # the bottom right cell can't be written
         if curses.has_colors() and "Error" in status_msg:
             stdscr.addstr(h - 1, 0, status_msg, curses.color_pair(2))
         else:
@@ -166,78 +230,146 @@ def display_menu(items, title, selected_index=0, status_msg="", headers=None):
 
     stdscr.refresh()
 
+    # Only draws a poster that is already decoded, otherwise it gets queued
+    if items:
+        draw_poster(items, selected_index)
 
 
 
-def select_from_list(items, title, allow_escape_up=False, headers=None):
+
+async def select_from_list(items, title, allow_escape_up=False, index=None, notice=""):
+    global active_scope
     selected_index = 0
-    filtered_items = items[:]
+    # Positions into items, in the order they are shown
+    positions = index.view() if index else list(range(len(items)))
+    shown = positions
+    filtered_items = [items[p] for p in shown]
     search_query = ""
     status_msg = "↑/↓: Navigate | Enter: Select | Q: Quit | /: Search"
+    if index:
+        status_msg += " | S: Sort | U: Unwatched | G: Genre | Y: Year"
     if allow_escape_up:
         status_msg += " | ESC: Go Back"
+    if notice:
+        status_msg = f"{notice} | {status_msg}"
+
+    index_actions = {}
+    if index:
+        for ch, action in (
+            ("s", index.next_sort),
+            ("u", index.toggle_unwatched),
+            ("g", index.next_genre),
+            ("y", index.next_year),
+        ):
+            index_actions[ord(ch)] = action
+            index_actions[ord(ch.upper())] = action
+
+    def menu_title():
+        return f"{title} [{index.describe()}]" if index else title
 
     def filter_items(query):
-        return [item for item in items if query.lower() in item["Name"].lower()]
-
-    display_menu(filtered_items, title, selected_index, status_msg, headers)
-
-    while True:
-        try:
-            key = stdscr.getch()
-
-            if key == ord('/'):  # Begin search
-                search_query = ""
-                stdscr.addstr(curses.LINES - 2, 0, "Search: ")
-                stdscr.clrtoeol()
-                curses.echo()
-                while True:
-                    ch = stdscr.getch()
-                    if ch in [10, 13]:  # Enter
-                        break
-                    elif ch in [27]:  # ESC to cancel
-                        search_query = ""
-                        break
-                    elif ch in [curses.KEY_BACKSPACE, 127]:
-                        search_query = search_query[:-1]
-                    else:
-                        try:
-                            search_query += chr(ch)
-                        except:
-                            pass
-                    filtered_items = filter_items(search_query)
-                    selected_index = 0
-                    stdscr.addstr(curses.LINES - 2, 0, f"Search: {search_query}")
+        return [p for p in positions if query.lower() in items[p]["Name"].lower()]
+
+    # Status lookups and poster loads started for this list die with it
+    scope = Scope()
+    active_scope = scope
+    requested = set()  # each show is looked up at most once per visit, failed or not
+
+    def load_statuses():
+        start, end = visible_range(len(filtered_items), selected_index)
+        for item in filtered_items[start:end]:
+            lookup = status_lookup(item)
+            if not lookup:
+                continue
+            show_id, server = lookup
+            if (server.url, show_id) in requested or get_cached_show_status(show_id, server):
+                continue
+            requested.add((server.url, show_id))
+            scope.spawn(load_watch_status(show_id, server))
+
+    def redraw(msg):
+        display_menu(filtered_items, menu_title(), selected_index, msg)
+        load_statuses()
+    try:
+        redraw(status_msg)
+
+        while True:
+            try:
+                key = await get_key()
+
+                if key == WAKE:  # background work finished, redraw with it
+                    redraw(status_msg)
+
+                elif key == ord('/'):  # Begin search
+                    search_query = ""
+                    stdscr.addstr(curses.LINES - 2, 0, "Search: ")
                     stdscr.clrtoeol()
-                    display_menu(filtered_items, title, selected_index, f"Search: {search_query}")
-                curses.noecho()
-                display_menu(filtered_items, title, selected_index, status_msg)
-
-            elif key == curses.KEY_UP and selected_index > 0:
-                selected_index -= 1
-                display_menu(filtered_items, title, selected_index, status_msg)
-            elif key == curses.KEY_DOWN and selected_index < len(filtered_items) - 1:
-                selected_index += 1
-                display_menu(filtered_items, title, selected_index, status_msg)
-            elif key == curses.KEY_ENTER or key in [10, 13]:
-                if filtered_items:
-                    return items.index(filtered_items[selected_index])
-            elif key == 27 and allow_escape_up:
-                return -1
-            elif key in [ord('q'), ord('Q')]:
-                cleanup()
-                os._exit(0)
-        except Exception as e:
-            display_menu(filtered_items, title, selected_index, f"Error: {str(e)}")
-    return selected_index
-
-
-
-
-def select_media_type():
+                    curses.echo()
+                    while True:
+                        ch = await get_key()
+                        if ch == WAKE:
+                            redraw(f"Search: {search_query}")
+                            continue
+                        elif ch in [10, 13]:  # Enter
+                            break
+                        elif ch in [ESC]:  # ESC to cancel
+                            search_query = ""
+                            break
+                        elif ch in [curses.KEY_BACKSPACE, 127]:
+                            search_query = search_query[:-1]
+                        else:
+                            try:
+                                search_query += chr(ch)
+                            except:
+                                pass
+                        shown = filter_items(search_query)
+                        filtered_items = [items[p] for p in shown]
+                        selected_index = 0
+                        stdscr.addstr(curses.LINES - 2, 0, f"Search: {search_query}")
+                        stdscr.clrtoeol()
+                        redraw(f"Search: {search_query}")
+                    curses.noecho()
+                    if not search_query:
+                        shown = positions
+                        filtered_items = [items[p] for p in shown]
+                    redraw(status_msg)
+
+                elif key in index_actions:
+                    # Swap to another precomputed view instead of re-sorting
+                    index_actions[key]()
+                    positions = index.view()
+                    shown = filter_items(search_query) if search_query else positions
+                    filtered_items = [items[p] for p in shown]
+                    selected_index = 0
+                    redraw(status_msg)
+                elif key == curses.KEY_UP and selected_index > 0:
+                    selected_index -= 1
+                    redraw(status_msg)
+                elif key == curses.KEY_DOWN and selected_index < len(filtered_items) - 1:
+                    selected_index += 1
+                    redraw(status_msg)
+                elif key == curses.KEY_ENTER or key in [10, 13]:
+                    if filtered_items:
+                        return shown[selected_index]
+                elif key == ESC and allow_escape_up:
+                    return -1
+                elif key in [ord('q'), ord('Q')]:
+                    cleanup()
+                    os._exit(0)
+            except Exception as e:
+                redraw(f"Error: {str(e)}")
+    finally:
+        # Leaving the list (either way) cancels whatever it still had in flight
+        scope.cancel()
+        active_scope = None
+
+
+
+
+async def select_media_type():
     options = [
         {"Name": "TV Shows", "Type": "Series"},
         {"Name": "Movies", "Type": "Movie"},
     ]
-    selected = select_from_list(options, "Select Media Type", allow_escape_up=False)
+    selected = await select_from_list(options, "Select Media Type", allow_escape_up=False)
     return options[selected]["Type"]